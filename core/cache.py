@@ -0,0 +1,301 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections.abc import Awaitable, Callable
+from contextlib import contextmanager
+from pathlib import Path
+
+from astrbot.api import logger
+
+from .profiler import record_io
+
+Renderer = Callable[[], Awaitable[bytes]]
+
+
+class CardStore(ABC):
+    """卡片缓存基类：同一进程内相同 key 只渲染一次"""
+
+    EVICT_INTERVAL = 20  # 每写入多少次执行一次淘汰
+
+    def __init__(self, max_bytes: int = 0, max_age: float = 0):
+        # 0 表示不限制
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._pending: dict[str, asyncio.Future] = {}
+        self._puts = 0
+
+    async def get_or_render(self, key: str, render: Renderer) -> bytes:
+        """读取缓存，未命中则渲染并写入"""
+        future = self._pending.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._load_or_render(key, render))
+            self._pending[key] = future
+            future.add_done_callback(lambda _: self._pending.pop(key, None))
+        return await asyncio.shield(future)
+
+    async def _load_or_render(self, key: str, render: Renderer) -> bytes:
+        if (data := self.get(key)) is not None:
+            logger.debug(f"命中缓存: {key}")
+            return data
+        data = await render()
+        try:
+            self.put(key, data)
+            logger.debug(f"写入缓存: {key}")
+        except OSError as e:
+            logger.warning(f"写入缓存失败：{e}")
+        return data
+
+    def _maybe_evict(self):
+        self._puts += 1
+        if self._puts % self.EVICT_INTERVAL == 0:
+            self.evict()
+
+    @abstractmethod
+    def get(self, key: str) -> bytes | None:
+        """读取卡片，不存在或已过期时返回 None"""
+
+    @abstractmethod
+    def put(self, key: str, data: bytes):
+        """写入卡片"""
+
+    @abstractmethod
+    def evict(self):
+        """按存活时间与总大小淘汰最旧的卡片"""
+
+    def close(self):
+        pass
+
+
+class FileCardStore(CardStore):
+    """每张卡片一个 PNG 文件（仅本进程使用）"""
+
+    def __init__(self, cache_dir: Path, max_bytes: int = 0, max_age: float = 0):
+        super().__init__(max_bytes, max_age)
+        self.cache_dir = cache_dir
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.evict()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.png"
+
+    def get(self, key: str) -> bytes | None:
+        path = self._path(key)
+        try:
+            if self.max_age and time.time() - path.stat().st_mtime > self.max_age:
+                return None
+            return path.read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: str, data: bytes):
+        self._path(key).write_bytes(data)
+        self._maybe_evict()
+
+    def evict(self):
+        if not self.max_bytes and not self.max_age:
+            return
+        entries = []
+        for path in self.cache_dir.glob("*.png"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+
+        now = time.time()
+        total = sum(size for _, size, _ in entries)
+        for mtime, size, path in entries:
+            expired = self.max_age and now - mtime > self.max_age
+            oversize = self.max_bytes and total > self.max_bytes
+            if not expired and not oversize:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+
+class SqliteCardStore(CardStore):
+    """SQLite(WAL) 单文件缓存，可供同一主机上的多个进程共享
+
+    缺失的卡片通过 render_locks 表加锁，保证只有一个进程负责渲染，
+    其他进程轮询等待结果；锁超时后视为持有者已退出，可被抢占。
+    数据库操作都在工作线程中执行，不阻塞事件循环；数据库繁忙或出错时
+    直接在本进程渲染，不写入缓存。
+    """
+
+    LOCK_TIMEOUT = 10.0  # 渲染锁有效期(秒)
+    BUSY_TIMEOUT = 1.0  # 单条语句等待其他进程写锁的上限(秒)
+    POLL_INTERVAL = 0.05
+
+    def __init__(self, db_path: Path, max_bytes: int = 0, max_age: float = 0):
+        super().__init__(max_bytes, max_age)
+        self.db_path = db_path
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._conn = sqlite3.connect(
+            db_path,
+            timeout=self.BUSY_TIMEOUT,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        # 同一连接上的操作需串行，避免事务互相穿插
+        self._db_lock = threading.Lock()
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS cards (
+                key TEXT PRIMARY KEY,
+                data BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_cards_created ON cards (created);
+            CREATE TABLE IF NOT EXISTS render_locks (
+                key TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                expires REAL NOT NULL
+            );
+            """
+        )
+        self.evict()
+
+    def get(self, key: str) -> bytes | None:
+        row = self._conn.execute(
+            "SELECT data, created FROM cards WHERE key = ?", (key,)
+        ).fetchone()
+        if not row:
+            return None
+        data, created = row
+        if self.max_age and time.time() - created > self.max_age:
+            return None
+        return data
+
+    def put(self, key: str, data: bytes):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO cards (key, data, size, created) VALUES (?, ?, ?, ?)",
+            (key, data, len(data), time.time()),
+        )
+        try:
+            self._maybe_evict()
+        except sqlite3.Error as e:
+            logger.warning(f"淘汰共享缓存失败：{e}")
+
+    def evict(self):
+        with self._transaction():
+            if self.max_age:
+                self._conn.execute(
+                    "DELETE FROM cards WHERE created < ?", (time.time() - self.max_age,)
+                )
+            if self.max_bytes:
+                (total,) = self._conn.execute(
+                    "SELECT COALESCE(SUM(size), 0) FROM cards"
+                ).fetchone()
+                if total > self.max_bytes:
+                    victims = []
+                    for key, size in self._conn.execute(
+                        "SELECT key, size FROM cards ORDER BY created"
+                    ):
+                        if total <= self.max_bytes:
+                            break
+                        victims.append((key,))
+                        total -= size
+                    self._conn.executemany("DELETE FROM cards WHERE key = ?", victims)
+            self._conn.execute(
+                "DELETE FROM render_locks WHERE expires < ?", (time.time(),)
+            )
+
+    async def _call(self, func: Callable, *args):
+        """在工作线程中执行数据库操作"""
+
+        def run():
+            with self._db_lock:
+                return func(*args)
+
+        start = time.perf_counter()
+        try:
+            return await asyncio.to_thread(run)
+        finally:
+            record_io(f"sqlite.{func.__name__}", time.perf_counter() - start)
+
+    async def _safe_get(self, key: str) -> bytes | None:
+        try:
+            return await self._call(self.get, key)
+        except sqlite3.Error as e:
+            logger.warning(f"读取共享缓存失败：{e}")
+            return None
+
+    async def _load_or_render(self, key: str, render: Renderer) -> bytes:
+        if (data := await self._safe_get(key)) is not None:
+            logger.debug(f"命中共享缓存: {key}")
+            return data
+
+        deadline = time.monotonic() + self.LOCK_TIMEOUT
+        while True:
+            try:
+                if await self._call(self._try_lock, key):
+                    break
+            except sqlite3.Error as e:
+                logger.warning(f"获取渲染锁失败：{e}，本次直接渲染且不写入缓存")
+                return await render()
+            await asyncio.sleep(self.POLL_INTERVAL)
+            if (data := await self._safe_get(key)) is not None:
+                logger.debug(f"命中共享缓存(等待其他进程渲染): {key}")
+                return data
+            if time.monotonic() > deadline:
+                logger.warning(f"等待渲染锁超时，本次直接渲染且不写入缓存: {key}")
+                return await render()
+
+        try:
+            # 拿到锁后再查一次，其他进程可能刚刚写入
+            if (data := await self._safe_get(key)) is not None:
+                return data
+            data = await render()
+            try:
+                await self._call(self.put, key, data)
+                logger.debug(f"写入共享缓存: {key}")
+            except sqlite3.Error as e:
+                logger.warning(f"写入共享缓存失败：{e}")
+            return data
+        finally:
+            try:
+                await self._call(self._unlock, key)
+            except sqlite3.Error as e:
+                logger.warning(f"释放渲染锁失败：{e}，将在锁超时后自动释放")
+
+    def _try_lock(self, key: str) -> bool:
+        with self._transaction():
+            now = time.time()
+            self._conn.execute(
+                "DELETE FROM render_locks WHERE key = ? AND expires < ?", (key, now)
+            )
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO render_locks (key, owner, expires) VALUES (?, ?, ?)",
+                (key, self._owner, now + self.LOCK_TIMEOUT),
+            )
+            return cursor.rowcount == 1
+
+    def _unlock(self, key: str):
+        self._conn.execute(
+            "DELETE FROM render_locks WHERE key = ? AND owner = ?", (key, self._owner)
+        )
+
+    @contextmanager
+    def _transaction(self):
+        """BEGIN IMMEDIATE 事务，提前拿到写锁，避免多进程升级锁时死锁"""
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+    def close(self):
+        with self._db_lock:
+            self._conn.close()
+
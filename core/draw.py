@@ -1,5 +1,7 @@
+import hashlib
 import io
 import random
+from collections import OrderedDict
 from io import BytesIO
 from pathlib import Path
 
@@ -18,103 +20,184 @@ class CardMaker:
     BORDER_THICKNESS = 10
     BORDER_COLOR_RANGE = (64, 255)
     CORNER_RADIUS = 30
+    LINE_HEIGHT = 40
+    EMOJI_OFFSET = 10
+    LINE_CACHE_SIZE = 64  # 文本行图块缓存条数
+    AVATAR_CACHE_SIZE = 4  # 头像图块缓存条数
+    GLYPH_CACHE_SIZE = 1024  # 单字字形缓存条数
 
     def __init__(self):
         self.cute_font = ImageFont.truetype(self.FONT_PATH, self.FONT_SIZE)
         self.emoji_font = ImageFont.truetype(self.EMOJI_FONT_PATH, self.FONT_SIZE)
+        # 复用的测量画布，避免每次创建临时图片
+        self._measure_draw = ImageDraw.Draw(Image.new("L", (1, 1)))
+        # 圆角遮罩缓存：尺寸 -> 遮罩
+        self._mask_cache: dict[int, Image.Image] = {}
+        # 增量渲染缓存：行文本 -> 行图块，(头像md5, 尺寸) -> 头像图块
+        self._line_cache: OrderedDict[str, Image.Image] = OrderedDict()
+        self._avatar_cache: OrderedDict[tuple[str, int], Image.Image] = OrderedDict()
+        # 字形缓存：(字符, 是否emoji) -> (字形遮罩, 左, 上, 步进)
+        self._glyph_cache: OrderedDict[
+            tuple[str, bool], tuple[Image.Image | None, int, int, int]
+        ] = OrderedDict()
 
     def create(self, avatar: bytes, reply: list) -> bytes:
+        """生成卡片；头像与未变化的文本行复用缓存图块，只重绘变化的行"""
         reply_str = "\n".join(reply)
 
         # 计算文本尺寸（去 emoji 占位）
-        temp_img = Image.new("RGBA", (1, 1))
-        temp_draw = ImageDraw.Draw(temp_img)
         no_emoji_reply = "".join("一" if emoji.is_emoji(c) else c for c in reply_str)
-        bbox = temp_draw.textbbox((0, 0), no_emoji_reply, font=self.cute_font)
+        bbox = self._measure_draw.textbbox(
+            (0, 0), no_emoji_reply, font=self.cute_font
+        )
         text_width = int(bbox[2] - bbox[0])
         text_height = int(bbox[3] - bbox[1])
 
         img_height = text_height + self.TEXT_PADDING * 2
-
-        # 处理头像
-        avatar_img = Image.open(BytesIO(avatar)).convert("RGBA")
         avatar_size = self.AVATAR_SIZE or text_height
-        avatar_img = avatar_img.resize((avatar_size, avatar_size))
-
-        img_width = avatar_img.width + text_width + self.TEXT_PADDING * 2
-
-        # 主图
-        img = Image.new("RGBA", (img_width, img_height), (255, 255, 255, 255))
+        img_width = avatar_size + text_width + self.TEXT_PADDING * 2
 
-        # 圆角头像
-        mask = Image.new("L", (avatar_size, avatar_size), 0)
-        mask_draw = ImageDraw.Draw(mask)
-        mask_draw.rounded_rectangle(
-            [(0, 0), (avatar_size, avatar_size)],
-            self.CORNER_RADIUS,
-            fill=255,
+        # 一次性创建带边框的最终画布，内容直接绘制在内框区域
+        border = self.BORDER_THICKNESS
+        border_color = tuple(random.randint(*self.BORDER_COLOR_RANGE) for _ in range(3))
+        # 卡片不透明，用 RGB 画布，贴图块时按图块透明度混合
+        img = Image.new(
+            "RGB", (img_width + border * 2, img_height + border * 2), border_color
         )
-        avatar_img.putalpha(mask)
-        img.paste(avatar_img, (0, (img_height - avatar_size) // 2), mask)
-
-        # 文本
-        self._draw_multi(
-            img,
-            reply_str,
-            avatar_img.width + self.TEXT_PADDING,
-            self.TEXT_PADDING,
+        ImageDraw.Draw(img).rectangle(
+            [(border, border), (border + img_width - 1, border + img_height - 1)],
+            fill=(255, 255, 255),
         )
 
-        # 边框
-        border_color = tuple(random.randint(*self.BORDER_COLOR_RANGE) for _ in range(3))
-        border_img = Image.new(
-            "RGBA",
-            (
-                img_width + self.BORDER_THICKNESS * 2,
-                img_height + self.BORDER_THICKNESS * 2,
-            ),
-            border_color,
-        )
-        border_img.paste(img, (self.BORDER_THICKNESS, self.BORDER_THICKNESS))
+        # 圆角头像
+        if avatar_size > 0:
+            img.paste(
+                self._get_avatar_tile(avatar, avatar_size),
+                (border, border + (img_height - avatar_size) // 2),
+                self._get_mask(avatar_size),
+            )
+
+        # 文本：逐行贴上图块，超出内框的部分裁掉
+        right = border + img_width
+        bottom = border + img_height
+        x = border + avatar_size + self.TEXT_PADDING
+        y = border + self.TEXT_PADDING
+        for line in reply_str.split("\n"):
+            if y >= bottom:
+                break
+            tile = self._get_line_tile(line)
+            if x + tile.width > right or y + tile.height > bottom:
+                tile = tile.crop(
+                    (0, 0, min(tile.width, right - x), min(tile.height, bottom - y))
+                )
+            if tile.width > 0 and tile.height > 0:
+                img.paste(tile, (x, y), tile)
+            y += self.LINE_HEIGHT
 
         out = io.BytesIO()
-        border_img.save(out, format="PNG")
+        img.save(out, format="PNG")
         return out.getvalue()
 
-    def _draw_multi(self, img, text, text_x=10, text_y=10):
-        lines = text.split("\n")
-        draw = ImageDraw.Draw(img)
-        current_y = text_y
-
-        for line in lines:
-            line_color = (
-                random.randint(0, 128),
-                random.randint(0, 128),
-                random.randint(0, 128),
-                random.randint(240, 255),
+    def _get_avatar_tile(self, avatar: bytes, size: int) -> Image.Image:
+        """获取（缓存的）缩放后头像"""
+        key = (hashlib.md5(avatar).hexdigest(), size)
+        tile = self._avatar_cache.get(key)
+        if tile is None:
+            tile = self._load_avatar(avatar, size)
+            self._cache_put(self._avatar_cache, key, tile, self.AVATAR_CACHE_SIZE)
+        else:
+            self._avatar_cache.move_to_end(key)
+        return tile
+
+    def _load_avatar(self, avatar: bytes, size: int) -> Image.Image:
+        """以接近目标尺寸的分辨率解码头像"""
+        avatar_img = Image.open(BytesIO(avatar))
+        # JPEG 可在解码阶段直接按 1/2、1/4、1/8 缩小
+        avatar_img.draft("RGB", (size, size))
+        if avatar_img.mode != "RGB":
+            avatar_img = avatar_img.convert("RGB")
+        # 其余格式解码后先做整数倍缩小，减少 resize 的工作量
+        factor = min(avatar_img.width, avatar_img.height) // size
+        if factor >= 2:
+            avatar_img = avatar_img.reduce(factor)
+        return avatar_img.resize((size, size))
+
+    def _get_mask(self, size: int) -> Image.Image:
+        """获取（缓存的）圆角遮罩"""
+        mask = self._mask_cache.get(size)
+        if mask is None:
+            mask = Image.new("L", (size, size), 0)
+            ImageDraw.Draw(mask).rounded_rectangle(
+                [(0, 0), (size, size)],
+                self.CORNER_RADIUS,
+                fill=255,
             )
-            current_x = text_x
-
-            for char in line:
-                if char in emoji.EMOJI_DATA:
-                    draw.text(
-                        (current_x, current_y + 10),
-                        char,
-                        font=self.emoji_font,
-                        fill=line_color,
-                    )
-                    bbox = self.emoji_font.getbbox(char)
-                else:
-                    draw.text(
-                        (current_x, current_y),
-                        char,
-                        font=self.cute_font,
-                        fill=line_color,
-                    )
-                    bbox = self.cute_font.getbbox(char)
-
-                current_x += bbox[2] - bbox[0]
-
-            current_y += 40
-
+            self._mask_cache[size] = mask
+        return mask
+
+    def _get_line_tile(self, line: str) -> Image.Image:
+        """获取（缓存的）单行文本图块，以行内容为键"""
+        tile = self._line_cache.get(line)
+        if tile is None:
+            tile = self._draw_line(line)
+            self._cache_put(self._line_cache, line, tile, self.LINE_CACHE_SIZE)
+        else:
+            self._line_cache.move_to_end(line)
+        return tile
+
+    def _draw_line(self, line: str) -> Image.Image:
+        """在透明图块上绘制一行文本，图块大小恰好容纳字形"""
+        line_color = (
+            random.randint(0, 128),
+            random.randint(0, 128),
+            random.randint(0, 128),
+            random.randint(240, 255),
+        )
 
+        # 先排版：每个字形遮罩的位置
+        placed = []
+        current_x = 0
+        width = height = 1
+        for char in line:
+            is_emoji = char in emoji.EMOJI_DATA
+            mask, left, top, advance = self._get_glyph(char, is_emoji)
+            if mask is not None:
+                x = current_x + left
+                y = top + (self.EMOJI_OFFSET if is_emoji else 0)
+                placed.append((mask, x, y))
+                width = max(width, x + mask.width)
+                height = max(height, y + mask.height)
+            current_x += advance
+
+        tile = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+        draw = ImageDraw.Draw(tile)
+        for mask, x, y in placed:
+            draw.bitmap((x, y), mask, fill=line_color)
+        return tile
+
+    def _get_glyph(
+        self, char: str, is_emoji: bool
+    ) -> tuple[Image.Image | None, int, int, int]:
+        """获取（缓存的）单字字形遮罩，与 draw.text 逐字绘制的结果一致"""
+        key = (char, is_emoji)
+        glyph = self._glyph_cache.get(key)
+        if glyph is not None:
+            self._glyph_cache.move_to_end(key)
+            return glyph
+
+        font = self.emoji_font if is_emoji else self.cute_font
+        left, top, right, bottom = font.getbbox(char)
+        mask = None
+        if right > left and bottom > top:
+            mask = Image.new("L", (right - left, bottom - top), 0)
+            ImageDraw.Draw(mask).text((-left, -top), char, font=font, fill=255)
+        glyph = (mask, left, top, right - left)
+        self._cache_put(self._glyph_cache, key, glyph, self.GLYPH_CACHE_SIZE)
+        return glyph
+
+    @staticmethod
+    def _cache_put(cache: OrderedDict, key, value, limit: int):
+        """写入 LRU 缓存并淘汰最旧的条目"""
+        cache[key] = value
+        while len(cache) > limit:
+            cache.popitem(last=False)
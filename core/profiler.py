@@ -0,0 +1,149 @@
+import asyncio
+import cProfile
+import io
+import pstats
+import time
+import tracemalloc
+import uuid
+from collections.abc import Awaitable
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any
+
+PLUGIN_DIR = str(Path(__file__).parent.parent)
+
+# cProfile 只分析启用它的线程，放到工作线程里的 I/O 需单独计时
+_io_timings: ContextVar[list[tuple[str, float]] | None] = ContextVar(
+    "box_io_timings", default=None
+)
+
+
+def record_io(name: str, seconds: float):
+    """记录一次工作线程 I/O 的耗时（仅在性能分析期间生效）"""
+    timings = _io_timings.get()
+    if timings is not None:
+        timings.append((name, seconds))
+
+
+class BoxProfiler:
+    """对单次开盒调用做 cProfile + tracemalloc 分析，报告写入文件"""
+
+    TOP_FUNCTIONS = 40
+    TOP_ALLOCATIONS = 20
+    SUMMARY_FUNCTIONS = 3
+
+    def __init__(self, output_dir: Path):
+        self.output_dir = output_dir
+        # cProfile 同一时刻只能有一个实例启用，分析任务需串行执行
+        self._lock = asyncio.Lock()
+
+    async def run(self, coro: Awaitable[Any], label: str) -> tuple[Any, str]:
+        """执行并分析协程，返回 (协程结果, 简要报告)
+
+        注意：cProfile 按线程采样，分析期间事件循环上其他任务的耗时也会被统计
+        """
+        async with self._lock:
+            started_tracing = not tracemalloc.is_tracing()
+            if started_tracing:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            before = tracemalloc.take_snapshot()
+
+            io_timings: list[tuple[str, float]] = []
+            token = _io_timings.set(io_timings)
+            profile = cProfile.Profile()
+            start = time.perf_counter()
+            profile.enable()
+            try:
+                result = await coro
+            finally:
+                profile.disable()
+                _io_timings.reset(token)
+                elapsed = time.perf_counter() - start
+                after = tracemalloc.take_snapshot()
+                _, peak = tracemalloc.get_traced_memory()
+                if started_tracing:
+                    tracemalloc.stop()
+
+        io_stats = self._aggregate_io(io_timings)
+        path = self._write_report(
+            label, profile, before, after, elapsed, peak, io_stats
+        )
+        return result, self._summary(profile, elapsed, peak, io_stats, path)
+
+    @staticmethod
+    def _aggregate_io(timings: list[tuple[str, float]]) -> dict[str, list[float]]:
+        """按操作汇总：名称 -> [次数, 总耗时]"""
+        stats: dict[str, list[float]] = {}
+        for name, seconds in timings:
+            entry = stats.setdefault(name, [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+        return stats
+
+    def _write_report(
+        self,
+        label: str,
+        profile: cProfile.Profile,
+        before: tracemalloc.Snapshot,
+        after: tracemalloc.Snapshot,
+        elapsed: float,
+        peak: int,
+        io_stats: dict[str, list[float]],
+    ) -> Path:
+        """写入完整的分析报告"""
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        # 同一秒内可能有多份报告，附加随机后缀避免覆盖
+        stamp = f"{time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+        path = self.output_dir / f"{stamp}_{label}.txt"
+
+        buffer = io.StringIO()
+        buffer.write(f"目标: {label}\n耗时: {elapsed * 1000:.1f} ms\n")
+        buffer.write(f"内存峰值: {peak / 1024:.1f} KiB\n\n")
+
+        buffer.write("==== cProfile (按累计耗时排序) ====\n")
+        stats = pstats.Stats(profile, stream=buffer)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.TOP_FUNCTIONS)
+
+        buffer.write("\n==== 工作线程 I/O (不在 cProfile 统计内，墙钟耗时) ====\n")
+        if not io_stats:
+            buffer.write("无\n")
+        for name, (count, total) in io_stats.items():
+            buffer.write(f"{name}: {int(count)} 次, 共 {total * 1000:.1f} ms\n")
+
+        buffer.write("\n==== tracemalloc (新增分配前几位) ====\n")
+        for stat in after.compare_to(before, "lineno")[: self.TOP_ALLOCATIONS]:
+            buffer.write(f"{stat}\n")
+
+        path.write_text(buffer.getvalue(), encoding="utf-8")
+        return path
+
+    def _summary(
+        self,
+        profile: cProfile.Profile,
+        elapsed: float,
+        peak: int,
+        io_stats: dict[str, list[float]],
+        path: Path,
+    ) -> str:
+        """生成聊天中回复的简要报告"""
+        stats = pstats.Stats(profile)
+        # stats.stats: {(file, line, func): (cc, nc, tt, ct, callers)}
+        # 只保留插件内的函数，并排除分析器自身
+        entries = sorted(
+            (
+                (ct, func)
+                for (filename, _, func), (_, _, _, ct, _) in stats.stats.items()  # type: ignore
+                if filename.startswith(PLUGIN_DIR) and filename != __file__
+            ),
+            reverse=True,
+        )
+        lines = [f"耗时 {elapsed * 1000:.1f} ms，内存峰值 {peak / 1024:.1f} KiB"]
+        for ct, func in entries[: self.SUMMARY_FUNCTIONS]:
+            lines.append(f"· {func}: {ct * 1000:.1f} ms")
+        if io_stats:
+            count = int(sum(c for c, _ in io_stats.values()))
+            total = sum(t for _, t in io_stats.values())
+            lines.append(f"· 缓存 I/O: {total * 1000:.1f} ms（{count} 次）")
+        lines.append(f"报告: {path.name}")
+        return "\n".join(lines)
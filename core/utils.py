@@ -12,9 +12,13 @@ from astrbot.core.platform.sources.aiocqhttp.aiocqhttp_message_event import (
 )
 
 
+# 头像地址模板（压测时可替换为本地服务器）
+AVATAR_URL = "https://q4.qlogo.cn/headimg_dl?dst_uin={user_id}&spec=640"
+
+
 async def get_avatar(user_id: str) -> bytes | None:
     """获取头像"""
-    avatar_url = f"https://q4.qlogo.cn/headimg_dl?dst_uin={user_id}&spec=640"
+    avatar_url = AVATAR_URL.format(user_id=user_id)
     try:
         async with aiohttp.ClientSession() as session:
             response = await session.get(avatar_url)
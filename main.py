@@ -1,6 +1,7 @@
 import asyncio
 import shutil
 import textwrap
+import time
 import weakref
 from io import BytesIO
 from pathlib import Path
@@ -21,8 +22,10 @@ from astrbot.core.platform.sources.aiocqhttp.aiocqhttp_message_event import (
 from astrbot.core.star.filter.platform_adapter_type import PlatformAdapterType
 from astrbot.core.star.star_tools import StarTools
 
+from .core.cache import CardStore, FileCardStore, SqliteCardStore
 from .core.draw import CardMaker
 from .core.field_mapping import FIELD_MAPPING, LABEL_TO_KEY
+from .core.profiler import BoxProfiler
 
 # library.py 可能缺失，导入时容错并静默降级
 try:
@@ -52,12 +55,22 @@ class BoxPlugin(Star):
         )
         # 卡片生成器
         self.renderer = CardMaker()
+        # 卡片缓存
+        self.card_store = self._create_card_store(config["cache"])
         # 撤回任务
         self._recall_tasks: weakref.WeakSet[asyncio.Task] = weakref.WeakSet()
         # Library客户端
         self.library = LibraryClient(config) if LibraryClient else None
         # 显示选项(控制这需要显示的字段)
         self.display_options: list[str] = config["display_options"]
+        # 性能分析：(会话, 管理员) -> 剩余需要分析的开盒次数
+        self._profile_sessions: dict[tuple[str, str], int] = {}
+        self.profile_dir: Path = self.cache_dir / "profiles"
+        self.profiler = BoxProfiler(self.profile_dir)
+        # 后台预热渲染流程
+        self._warmup_task: asyncio.Task | None = None
+        if config["warmup"]:
+            self._warmup_task = asyncio.create_task(self._warmup())
 
     @filter.command("盒", alias={"开盒"})
     async def on_command(
@@ -72,6 +85,21 @@ class BoxPlugin(Star):
         for tid in target_ids:
             await self.box(event, target_id=tid, group_id=event.get_group_id())
 
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    @filter.command("盒分析")
+    async def on_profile_command(self, event: AiocqhttpMessageEvent, count: int = 1):
+        """盒分析 N：对自己在本会话接下来的 N 次开盒进行性能分析"""
+        key = (event.unified_msg_origin, event.get_sender_id())
+        count = max(0, int(count))
+        if count:
+            self._profile_sessions[key] = count
+            msg = f"将对你在本会话接下来的 {count} 次开盒进行性能分析"
+        else:
+            self._profile_sessions.pop(key, None)
+            msg = "已关闭性能分析"
+        await event.send(event.plain_result(msg))
+        event.stop_event()
+
     @filter.platform_adapter_type(PlatformAdapterType.AIOCQHTTP)
     async def handle_group_add(self, event: AiocqhttpMessageEvent):
         """自动开盒新群友/主动退群之人"""
@@ -107,6 +135,26 @@ class BoxPlugin(Star):
             await self.box(event, target_id=str(user_id), group_id=str(group_id))
 
     async def box(self, event: AiocqhttpMessageEvent, target_id: str, group_id: str):
+        """开盒（按需进行性能分析）"""
+        if not self._profile_sessions:
+            return await self._box(event, target_id, group_id)
+
+        # 只分析开启分析的管理员本人在该会话中触发的开盒
+        key = (event.unified_msg_origin, event.get_sender_id())
+        remaining = self._profile_sessions.get(key)
+        if not remaining:
+            return await self._box(event, target_id, group_id)
+        if remaining > 1:
+            self._profile_sessions[key] = remaining - 1
+        else:
+            del self._profile_sessions[key]
+        result, summary = await self.profiler.run(
+            self._box(event, target_id, group_id), label=f"{target_id}_{group_id}"
+        )
+        await event.send(event.plain_result(f"【开盒性能分析】\n{summary}"))
+        return result
+
+    async def _box(self, event: AiocqhttpMessageEvent, target_id: str, group_id: str):
         """开盒主流程"""
         # 获取用户信息
         try:
@@ -147,16 +195,15 @@ class BoxPlugin(Star):
                 logger.warning(f"获取真实信息失败:{e}，已跳过 ")
 
         # 缓存机制
+        async def render() -> bytes:
+            # 预热尚未完成时等待，避免与后台线程同时使用字体
+            if self._warmup_task and not self._warmup_task.done():
+                await self._warmup_task
+            return self.renderer.create(avatar, display)
+
         digest = render_digest(display, avatar)
-        cache_name = f"{target_id}_{group_id}_{digest}.png"
-        cache_path = self.cache_dir / cache_name
-        if cache_path.exists():
-            image = cache_path.read_bytes()
-            logger.debug(f"命中缓存: {cache_path}")
-        else:
-            image: bytes = self.renderer.create(avatar, display)
-            cache_path.write_bytes(image)
-            logger.debug(f"写入缓存: {cache_path}")
+        cache_key = f"{target_id}_{group_id}_{digest}"
+        image = await self.card_store.get_or_render(cache_key, render)
 
         # 消息链
         chain: list[BaseMessageComponent] = [Comp.Image.fromBytes(image)]
@@ -313,8 +360,70 @@ class BoxPlugin(Star):
 
         return []
 
+    def _create_card_store(self, conf: dict) -> CardStore:
+        """根据配置创建卡片缓存"""
+        max_bytes = int(conf["max_size_mb"]) * 1024 * 1024
+        max_age = int(conf["max_age_hours"]) * 3600
+        if conf["backend"] == "sqlite":
+            db_path = (
+                Path(conf["shared_path"]).expanduser()
+                if conf["shared_path"]
+                else self.cache_dir / "cards.db"
+            )
+            try:
+                return SqliteCardStore(db_path, max_bytes, max_age)
+            except Exception as e:
+                logger.error(f"[BoxPlugin] 打开共享缓存失败：{e}，改用文件缓存")
+        return FileCardStore(self.cache_dir, max_bytes, max_age)
+
+    async def _warmup(self):
+        """预热：在后台线程渲染一张示例卡片"""
+        start = time.perf_counter()
+        try:
+            await asyncio.to_thread(self._warmup_render)
+        except Exception as e:
+            logger.warning(f"[BoxPlugin] 预热失败：{e}")
+            return
+        cost = (time.perf_counter() - start) * 1000
+        logger.info(f"[BoxPlugin] 预热完成，耗时 {cost:.0f} ms")
+
+    def _warmup_render(self):
+        """走一遍 _transform -> CardMaker.create 的完整流程"""
+        stranger_info = {
+            "user_id": 10000,
+            "nickname": "预热✨",
+            "sex": "female",
+            "birthday_year": 2000,
+            "birthday_month": 2,
+            "birthday_day": 3,
+            "age": 24,
+            "kBloodType": 1,
+            "homeTown": "49-98-0",
+            "country": "中国",
+            "province": "北京",
+            "city": "北京",
+            "makeFriendCareer": 1,
+            "is_vip": True,
+            "vip_level": 1,
+            "qqLevel": 85,
+            "reg_time": 1000000000,
+            "long_nick": "预热用的个性签名🎉",
+        }
+        member_info = {"card": "预热", "title": "头衔", "level": 1, "join_time": 1}
+        display = self._transform(stranger_info, member_info)
+        # qlogo 头像为 JPEG，顺带预热 JPEG 解码
+        with BytesIO() as buffer:
+            Image.new("RGB", (640, 640), (255, 255, 255)).save(buffer, format="JPEG")
+            avatar = buffer.getvalue()
+        render_digest(display, avatar)
+        self.renderer.create(avatar, display)
+
     async def terminate(self):
         """插件卸载时"""
+        # 取消未完成的预热
+        if self._warmup_task and not self._warmup_task.done():
+            self._warmup_task.cancel()
+
         # 取消未完成的撤回任务
         if self._recall_tasks:
             for t in list(self._recall_tasks):
@@ -325,11 +434,19 @@ class BoxPlugin(Star):
         if self.library:
             await self.library.close()
 
-        # 3. 清空缓存目录
+        # 关闭卡片缓存
+        self.card_store.close()
+
+        # 3. 清空缓存目录（保留性能分析报告；共享缓存文件不在此目录时不受影响）
         if self.conf["clean_cache"] and self.cache_dir and self.cache_dir.exists():
             try:
-                shutil.rmtree(self.cache_dir)
+                for path in self.cache_dir.iterdir():
+                    if path == self.profile_dir:
+                        continue
+                    if path.is_dir():
+                        shutil.rmtree(path)
+                    else:
+                        path.unlink()
                 logger.debug(f"[BoxPlugin] 缓存已清空：{self.cache_dir}")
             except Exception as e:
                 logger.error(f"[BoxPlugin] 清空缓存失败：{e}")
-            self.cache_dir.mkdir(parents=True, exist_ok=True)
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# core/ 下的渲染模块不依赖 AstrBot，可直接导入测试
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
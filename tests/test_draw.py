@@ -0,0 +1,159 @@
+"""CardMaker 渲染测试：与旧版"双画布"实现对比内存峰值与图像分配次数
+
+tracemalloc 看不到 Pillow 在 C 层分配的像素缓冲区，因此：
+- 内存峰值用 glibc mallinfo2 统计的堆用量衡量（包含像素缓冲区）；
+- 分配次数用 Pillow 自带的 Image.core.get_stats()["new_count"] 统计。
+"""
+
+import ctypes
+import gc
+import io
+import sys
+from io import BytesIO
+
+import emoji
+import pytest
+from PIL import Image, ImageDraw
+
+from core.draw import CardMaker
+
+LINES = [f"第{i}行：测试文本内容✨abc" for i in range(20)]
+
+
+def make_avatar(size: int = 640) -> bytes:
+    with BytesIO() as buffer:
+        Image.new("RGB", (size, size), (200, 100, 50)).save(buffer, format="JPEG")
+        return buffer.getvalue()
+
+
+# ---- 对照组：冻结的旧版 CardMaker.create（双画布），只用于比较，请勿随生产代码修改 ----
+def baseline_create(maker: CardMaker, avatar: bytes, reply: list) -> bytes:
+    text = "\n".join(reply)
+    measure_text = "".join("一" if emoji.is_emoji(c) else c for c in text)
+    left, top, right, bottom = ImageDraw.Draw(Image.new("RGBA", (1, 1))).textbbox(
+        (0, 0), measure_text, font=maker.cute_font
+    )
+    size = int(bottom - top)
+    width, height = size + int(right - left) + 20, size + 20
+
+    face = Image.open(BytesIO(avatar)).convert("RGBA").resize((size, size))
+    mask = Image.new("L", (size, size), 0)
+    ImageDraw.Draw(mask).rounded_rectangle([(0, 0), (size, size)], 30, fill=255)
+    face.putalpha(mask)
+    img = Image.new("RGBA", (width, height), (255, 255, 255, 255))
+    img.paste(face, (0, (height - size) // 2), mask)
+
+    draw = ImageDraw.Draw(img)
+    for row, line in enumerate(text.split("\n")):
+        x, y = size + 10, 10 + row * 40
+        for char in line:
+            is_emoji = char in emoji.EMOJI_DATA
+            font = maker.emoji_font if is_emoji else maker.cute_font
+            draw.text((x, y + 10 * is_emoji), char, font=font, fill=(0, 0, 0, 255))
+            char_left, _, char_right, _ = font.getbbox(char)
+            x += char_right - char_left
+
+    card = Image.new("RGBA", (width + 20, height + 20), (128, 128, 128))
+    card.paste(img, (10, 10))
+    out = io.BytesIO()
+    card.save(out, format="PNG")
+    return out.getvalue()
+
+
+class _MallInfo2(ctypes.Structure):
+    _fields_ = [
+        (name, ctypes.c_size_t)
+        for name in (
+            "arena ordblks smblks hblks hblkhd usmblks "
+            "fsmblks uordblks fordblks keepcost"
+        ).split()
+    ]
+
+
+def _load_mallinfo2():
+    try:
+        func = ctypes.CDLL(None).mallinfo2
+    except (AttributeError, OSError):
+        return None
+    func.restype = _MallInfo2
+    return func
+
+
+_mallinfo2 = _load_mallinfo2()
+
+
+def _heap_in_use() -> int:
+    """glibc 堆上正在使用的字节数（含 mmap 分配的大块，即 Pillow 像素缓冲区）"""
+    info = _mallinfo2()  # type: ignore
+    return info.uordblks + info.hblkhd
+
+
+def measure(create, avatar: bytes) -> dict:
+    """渲染一张卡片，返回堆内存峰值增量(KB)与 Pillow 图像分配次数
+
+    每次 Python/C 调用返回时采样堆用量，Pillow 的分配都发生在 C 调用内，
+    调用返回时即可观察到，因此峰值是确定的。
+    """
+    gc.collect()
+    start = peak = _heap_in_use()
+
+    def sample(frame, event, arg):
+        nonlocal peak
+        peak = max(peak, _heap_in_use())
+
+    count = Image.core.get_stats()["new_count"]
+    sys.setprofile(sample)
+    try:
+        create(avatar, LINES)
+    finally:
+        sys.setprofile(None)
+    return {
+        "peak_kb": (peak - start) // 1024,
+        "allocations": Image.core.get_stats()["new_count"] - count,
+    }
+
+
+@pytest.fixture(scope="module")
+def maker() -> CardMaker:
+    return CardMaker()
+
+
+def test_create_matches_baseline_size(maker: CardMaker):
+    avatar = make_avatar()
+    card = Image.open(BytesIO(maker.create(avatar, LINES)))
+    expected = Image.open(BytesIO(baseline_create(maker, avatar, LINES)))
+    assert card.size == expected.size
+    # 卡片不透明，无需 alpha 通道
+    assert card.mode == "RGB"
+
+
+def test_masks_and_tiles_are_cached(maker: CardMaker):
+    avatar = make_avatar()
+    maker.create(avatar, LINES)
+    masks = dict(maker._mask_cache)
+    tiles = {line: maker._line_cache[line] for line in LINES}
+    maker.create(avatar, LINES)
+    assert maker._mask_cache == masks
+    assert all(maker._line_cache[line] is tiles[line] for line in LINES)
+
+
+@pytest.mark.skipif(_mallinfo2 is None, reason="需要 glibc mallinfo2")
+def test_peak_memory_and_allocations_below_baseline():
+    avatar = make_avatar()
+    old_maker = CardMaker()
+    new_maker = CardMaker()
+    for maker in (old_maker, new_maker):
+        # 先渲染一张小卡片，排除字体等一次性初始化
+        maker.create(avatar, ["预热"])
+
+    old = measure(lambda a, r: baseline_create(old_maker, a, r), avatar)
+    first = measure(new_maker.create, avatar)
+    repeat = measure(new_maker.create, avatar)
+
+    # 单画布：即使首次渲染还要填充行图块/头像缓存，峰值也低于双画布
+    assert first["peak_kb"] < old["peak_kb"]
+    # 重复渲染复用缓存图块，峰值与分配次数都大幅下降
+    assert repeat["peak_kb"] * 3 < old["peak_kb"] * 2
+    assert repeat["allocations"] * 4 < old["allocations"]
+    # 首次渲染（缓存未命中的常见情形）的分配次数也不能多于旧版
+    assert first["allocations"] <= old["allocations"]
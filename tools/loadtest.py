@@ -0,0 +1,549 @@
+"""离线压测工具：本地伪造 OneBot 客户端与头像服务器，回放开盒指令/进群事件
+
+需在已安装 AstrBot 的环境中运行，例如：
+
+    python tools/loadtest.py --seed 1 --out report.json
+    python tools/loadtest.py --scenario my_scenario.json --stranger-latency 0.05
+    python tools/loadtest.py --delete-latency 0.1 --delete-error-rate 0.2
+
+场景文件为 JSON 列表，每一步形如：
+
+    {"kind": "command", "count": 200, "concurrency": 8, "users": 50}
+    {"kind": "group_increase", "count": 100, "concurrency": 32, "users": 100}
+
+同一 seed + 同一场景 的用户、资料、每次调用的延迟与是否出错完全一致
+（按请求编号与接口确定，与并发调度顺序无关），可用于跨版本对比。
+"""
+
+import argparse
+import asyncio
+import importlib
+import json
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from io import BytesIO
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any
+
+from aiohttp import web
+from PIL import Image
+
+PLUGIN_DIR = Path(__file__).resolve().parent.parent
+
+DEFAULT_SCENARIO: list[dict[str, Any]] = [
+    {"kind": "command", "count": 100, "concurrency": 4, "users": 30},
+    {"kind": "group_increase", "count": 50, "concurrency": 25, "users": 50},
+    {"kind": "command", "count": 100, "concurrency": 16, "users": 30},
+]
+
+
+class FakeOneBot:
+    """模拟 OneBot 客户端，支持按接口配置延迟与错误率
+
+    每次调用的抖动与是否出错只由 (seed, 请求编号, 接口, 第几次调用) 决定，
+    与并发调度顺序无关，保证同一 seed 的多次运行完全一致。
+    """
+
+    def __init__(
+        self,
+        seed: int,
+        latency: dict[str, float],
+        error_rate: dict[str, float],
+        jitter: float,
+    ):
+        self.seed = seed
+        self.latency = latency
+        self.error_rate = error_rate
+        self.jitter = jitter
+        self.calls: dict[str, int] = {}
+        self.errors: dict[str, int] = {}
+        self.sent: list[dict] = []
+        self._message_id = 0
+
+    def for_request(self, request_key: str) -> "OneBotSession":
+        """返回绑定到某次请求的客户端视图"""
+        return OneBotSession(self, request_key)
+
+    async def _simulate(self, request_key: str, action: str, call_index: int):
+        self.calls[action] = self.calls.get(action, 0) + 1
+        rng = random.Random(f"{self.seed}/{request_key}/{action}/{call_index}")
+        delay = self.latency.get(action, 0.0) * (
+            1 + rng.uniform(-self.jitter, self.jitter)
+        )
+        failed = rng.random() < self.error_rate.get(action, 0.0)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if failed:
+            self.errors[action] = self.errors.get(action, 0) + 1
+            raise RuntimeError(f"模拟 {action} 失败")
+
+    def _next_message_id(self) -> int:
+        self._message_id += 1
+        return self._message_id
+
+
+class OneBotSession:
+    """单次请求使用的 OneBot 接口"""
+
+    def __init__(self, bot: FakeOneBot, request_key: str):
+        self._bot = bot
+        self._key = request_key
+        self._call_counts: dict[str, int] = {}
+
+    async def _simulate(self, action: str):
+        index = self._call_counts.get(action, 0)
+        self._call_counts[action] = index + 1
+        await self._bot._simulate(self._key, action, index)
+
+    async def get_stranger_info(self, user_id: int, no_cache: bool = False) -> dict:
+        await self._simulate("get_stranger_info")
+        return fake_stranger_info(user_id)
+
+    async def get_group_member_info(self, user_id: int, group_id: int) -> dict:
+        await self._simulate("get_group_member_info")
+        return fake_member_info(user_id, group_id)
+
+    async def send_group_msg(self, group_id: int, message: Any) -> dict:
+        await self._simulate("send_group_msg")
+        message_id = self._bot._next_message_id()
+        self._bot.sent.append({"group_id": group_id, "message_id": message_id})
+        return {"message_id": message_id}
+
+    async def send_private_msg(self, user_id: int, message: Any) -> dict:
+        await self._simulate("send_private_msg")
+        message_id = self._bot._next_message_id()
+        self._bot.sent.append({"user_id": user_id, "message_id": message_id})
+        return {"message_id": message_id}
+
+    async def delete_msg(self, message_id: int):
+        await self._simulate("delete_msg")
+
+
+class FakeEvent:
+    """模拟 AiocqhttpMessageEvent 中插件用到的部分"""
+
+    SELF_ID = "10000"
+
+    def __init__(
+        self,
+        bot: OneBotSession,
+        sender_id: str,
+        group_id: str,
+        message_str: str = "",
+        raw_message: dict | None = None,
+        admin: bool = False,
+    ):
+        self.bot = bot
+        self.message_str = message_str
+        self.unified_msg_origin = f"aiocqhttp:GroupMessage:{group_id}"
+        self.message_obj = SimpleNamespace(raw_message=raw_message)
+        self._sender_id = sender_id
+        self._group_id = group_id
+        self._admin = admin
+        self.replies: list[Any] = []
+        self.stopped = False
+
+    def is_admin(self) -> bool:
+        return self._admin
+
+    def get_sender_id(self) -> str:
+        return self._sender_id
+
+    def get_group_id(self) -> str:
+        return self._group_id
+
+    def get_self_id(self) -> str:
+        return self.SELF_ID
+
+    def get_messages(self) -> list:
+        return []
+
+    def chain_result(self, chain: list) -> list:
+        return chain
+
+    def plain_result(self, text: str) -> str:
+        return text
+
+    async def send(self, result: Any):
+        self.replies.append(result)
+
+    async def _parse_onebot_json(self, message_chain: Any) -> list:
+        return [{"type": "image", "data": {}}]
+
+    def stop_event(self):
+        self.stopped = True
+
+
+def fake_stranger_info(user_id: int) -> dict:
+    """按 QQ 号确定性地生成用户资料"""
+    rng = random.Random(user_id)
+    return {
+        "user_id": user_id,
+        "nickname": f"测试用户{user_id % 1000}✨",
+        "sex": rng.choice(["male", "female", "unknown"]),
+        "birthday_year": rng.randint(1980, 2010),
+        "birthday_month": rng.randint(1, 12),
+        "birthday_day": rng.randint(1, 28),
+        "age": rng.randint(12, 45),
+        "kBloodType": rng.randint(0, 5),
+        "homeTown": f"49-{rng.randint(98, 107)}-0",
+        "country": "中国",
+        "province": "广东",
+        "city": "深圳",
+        "makeFriendCareer": rng.randint(0, 14),
+        "is_vip": rng.random() < 0.3,
+        "is_years_vip": rng.random() < 0.1,
+        "vip_level": rng.randint(0, 8),
+        "qqLevel": rng.randint(1, 150),
+        "reg_time": rng.randint(1_100_000_000, 1_700_000_000),
+        "long_nick": "这是一段用于压测的个性签名🎉" * rng.randint(0, 3),
+    }
+
+
+def fake_member_info(user_id: int, group_id: int) -> dict:
+    """按 QQ 号+群号确定性地生成群成员资料"""
+    rng = random.Random(user_id * 31 + group_id)
+    return {
+        "card": f"群名片{user_id % 100}",
+        "title": rng.choice(["", "头衔", "龙王🐉"]),
+        "level": rng.randint(1, 100),
+        "join_time": rng.randint(1_500_000_000, 1_700_000_000),
+    }
+
+
+class AvatarServer:
+    """本地头像服务器，路径与参数与 qlogo 一致"""
+
+    def __init__(self, latency: float = 0.0, size: int = 640):
+        self.latency = latency
+        self.size = size
+        self.requests = 0
+        self._cache: dict[str, bytes] = {}
+        self._runner: web.AppRunner | None = None
+        self.port = 0
+
+    def _make_avatar(self, uin: str) -> bytes:
+        if uin not in self._cache:
+            rng = random.Random(uin)
+            color = tuple(rng.randint(0, 255) for _ in range(3))
+            with BytesIO() as buffer:
+                Image.new("RGB", (self.size, self.size), color).save(
+                    buffer, format="JPEG"
+                )
+                self._cache[uin] = buffer.getvalue()
+        return self._cache[uin]
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        uin = request.query.get("dst_uin", "0")
+        return web.Response(body=self._make_avatar(uin), content_type="image/jpeg")
+
+    async def start(self) -> str:
+        app = web.Application()
+        app.router.add_get("/headimg_dl", self._handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        self.port = self._runner.addresses[0][1]
+        return f"http://127.0.0.1:{self.port}/headimg_dl?dst_uin={{user_id}}&spec=640"
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+
+
+class LoopLagMonitor:
+    """事件循环延迟采样"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples: list[float] = []
+        self._task: asyncio.Task | None = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - start - self.interval))
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+
+def default_config() -> dict:
+    """从 _conf_schema.json 读取默认配置"""
+    schema = json.loads((PLUGIN_DIR / "_conf_schema.json").read_text("utf-8"))
+    config: dict[str, Any] = {}
+    for key, item in schema.items():
+        if item.get("type") == "object":
+            config[key] = {k: v.get("default") for k, v in item["items"].items()}
+        else:
+            config[key] = item.get("default")
+    return config
+
+
+def load_plugin_module():
+    """以包的形式导入插件，保证相对导入可用"""
+    sys.path.insert(0, str(PLUGIN_DIR.parent))
+    return importlib.import_module(f"{PLUGIN_DIR.name}.main")
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(values: list[float]) -> dict[str, float]:
+    return {
+        "count": len(values),
+        "mean_ms": statistics.fmean(values) * 1000 if values else 0.0,
+        "p50_ms": percentile(values, 50) * 1000,
+        "p99_ms": percentile(values, 99) * 1000,
+        "max_ms": max(values, default=0.0) * 1000,
+    }
+
+
+def max_rss_mb() -> float | None:
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 单位为字节，Linux 为 KB
+    return rss / 1024 / 1024 if sys.platform == "darwin" else rss / 1024
+
+
+async def run_step(
+    plugin,
+    bot: FakeOneBot,
+    step_index: int,
+    step: dict,
+    rng: random.Random,
+    group_id: str,
+) -> tuple[list[float], int]:
+    """执行一个场景步骤，返回每次调用的端到端耗时与异常数"""
+    kind = step.get("kind", "command")
+    count = int(step.get("count", 100))
+    users = [str(200000 + i) for i in range(int(step.get("users", 50)))]
+    semaphore = asyncio.Semaphore(int(step.get("concurrency", 1)))
+    targets = [rng.choice(users) for _ in range(count)]
+    latencies: list[float] = []
+    failures = 0
+
+    async def dispatch(request_index: int, target: str):
+        nonlocal failures
+        session = bot.for_request(f"{step_index}/{request_index}")
+        if kind == "group_increase":
+            event = FakeEvent(
+                session,
+                sender_id=target,
+                group_id=group_id,
+                raw_message={
+                    "post_type": "notice",
+                    "notice_type": "group_increase",
+                    "self_id": FakeEvent.SELF_ID,
+                    "user_id": target,
+                    "group_id": group_id,
+                },
+            )
+            handler = plugin.handle_group_add(event)
+        else:
+            event = FakeEvent(
+                session,
+                sender_id="100001",
+                group_id=group_id,
+                message_str=f"盒 @{target}",
+            )
+            handler = plugin.on_command(event)
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await handler
+            except Exception:
+                failures += 1
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(dispatch(i, t) for i, t in enumerate(targets)))
+    return latencies, failures
+
+
+async def run(args: argparse.Namespace) -> dict:
+    rng = random.Random(args.seed)
+    random.seed(args.seed)  # 卡片颜色等插件内部随机量
+
+    scenario = (
+        json.loads(Path(args.scenario).read_text("utf-8"))
+        if args.scenario
+        else DEFAULT_SCENARIO
+    )
+
+    module = load_plugin_module()
+    utils = importlib.import_module(f"{PLUGIN_DIR.name}.core.utils")
+
+    avatar_server = AvatarServer(latency=args.avatar_latency)
+    utils.AVATAR_URL = await avatar_server.start()
+
+    bot = FakeOneBot(
+        args.seed,
+        latency={
+            "get_stranger_info": args.stranger_latency,
+            "get_group_member_info": args.member_latency,
+            "send_group_msg": args.send_latency,
+            "send_private_msg": args.private_latency,
+            "delete_msg": args.delete_latency,
+        },
+        error_rate={
+            "get_stranger_info": args.stranger_error_rate,
+            "get_group_member_info": args.member_error_rate,
+            "send_group_msg": args.send_error_rate,
+            "send_private_msg": args.private_error_rate,
+            "delete_msg": args.delete_error_rate,
+        },
+        jitter=args.jitter,
+    )
+
+    # 未指定 --cache-dir 时使用临时目录，压测结束后删除
+    temp_dir = (
+        None if args.cache_dir else tempfile.TemporaryDirectory(prefix="box_loadtest_")
+    )
+    cache_dir = Path(args.cache_dir or temp_dir.name)  # type: ignore
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    module.StarTools.get_data_dir = classmethod(lambda cls, name=None: cache_dir)
+
+    config = default_config()
+    config.update(
+        increase_box=True, recall_time=args.recall_time, clean_cache=False
+    )
+    context = SimpleNamespace(get_config=lambda: {"admins_id": []})
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    monitor = LoopLagMonitor()
+    monitor.start()
+
+    plugin = module.BoxPlugin(context, config)  # type: ignore
+    step_reports = []
+    all_latencies: list[float] = []
+    total_failures = 0
+    wall_start = time.perf_counter()
+    try:
+        for index, step in enumerate(scenario):
+            step_start = time.perf_counter()
+            latencies, failures = await run_step(
+                plugin, bot, index, step, rng, args.group_id
+            )
+            elapsed = time.perf_counter() - step_start
+            all_latencies.extend(latencies)
+            total_failures += failures
+            step_reports.append(
+                {
+                    "index": index,
+                    **step,
+                    "elapsed_s": elapsed,
+                    "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+                    "failures": failures,
+                    "latency": summarize(latencies),
+                }
+            )
+        wall = time.perf_counter() - wall_start
+        # 等待撤回任务全部完成
+        if plugin._recall_tasks:
+            await asyncio.gather(*plugin._recall_tasks, return_exceptions=True)
+    finally:
+        await monitor.stop()
+        await plugin.terminate()
+        await avatar_server.stop()
+        cache_files = sum(1 for _ in cache_dir.iterdir())
+        if temp_dir:
+            temp_dir.cleanup()
+
+    memory: dict[str, Any] = {"max_rss_mb": max_rss_mb()}
+    if args.tracemalloc:
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        memory.update(
+            traced_current_mb=current / 1024 / 1024, traced_peak_mb=peak / 1024 / 1024
+        )
+
+    return {
+        "seed": args.seed,
+        "python": platform.python_version(),
+        "pillow": Image.__version__,
+        "plugin_version": _plugin_version(),
+        "total_requests": len(all_latencies),
+        "failures": total_failures,
+        "wall_s": wall,
+        "throughput_rps": len(all_latencies) / wall if wall else 0.0,
+        "latency": summarize(all_latencies),
+        "loop_lag": summarize(monitor.samples),
+        "memory": memory,
+        "onebot_calls": bot.calls,
+        "onebot_errors": bot.errors,
+        "avatar_requests": avatar_server.requests,
+        "cache_files": cache_files,
+        "steps": step_reports,
+    }
+
+
+def _plugin_version() -> str:
+    for line in (PLUGIN_DIR / "metadata.yaml").read_text("utf-8").splitlines():
+        if line.startswith("version:"):
+            return line.split(":", 1)[1].split("#")[0].strip()
+    return "unknown"
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="开盒插件离线压测")
+    parser.add_argument("--scenario", help="场景 JSON 文件，缺省使用内置场景")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--group-id", default="123456")
+    parser.add_argument("--recall-time", type=int, default=1, help="撤回时间(秒)")
+    parser.add_argument("--cache-dir", help="缓存目录，缺省使用新的临时目录")
+    parser.add_argument("--stranger-latency", type=float, default=0.02)
+    parser.add_argument("--member-latency", type=float, default=0.02)
+    parser.add_argument("--send-latency", type=float, default=0.01)
+    parser.add_argument("--private-latency", type=float, default=0.01)
+    parser.add_argument("--delete-latency", type=float, default=0.01)
+    parser.add_argument("--avatar-latency", type=float, default=0.02)
+    parser.add_argument("--jitter", type=float, default=0.2, help="延迟抖动比例")
+    parser.add_argument("--stranger-error-rate", type=float, default=0.0)
+    parser.add_argument("--member-error-rate", type=float, default=0.0)
+    parser.add_argument("--send-error-rate", type=float, default=0.0)
+    parser.add_argument("--private-error-rate", type=float, default=0.0)
+    parser.add_argument("--delete-error-rate", type=float, default=0.0)
+    parser.add_argument(
+        "--tracemalloc", action="store_true", help="记录 Python 内存峰值（会拖慢速度）"
+    )
+    parser.add_argument("--out", help="报告输出路径（JSON），缺省打印到标准输出")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None):
+    args = parse_args(argv)
+    report = asyncio.run(run(args))
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        Path(args.out).write_text(text, encoding="utf-8")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()